@@ -1,11 +1,23 @@
 import os
+import re
 import csv
+import asyncio
+import signal
+import time
+import hashlib
+import tempfile
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import MemoryHandler, RotatingFileHandler
+from collections import namedtuple
+from dataclasses import dataclass
 from datetime import datetime
-from PIL import Image, ImageDraw, ImageFont
-import requests
+from functools import lru_cache
+from email.utils import formatdate
 import json
+try:
+    import orjson  # Optional, parses the API response faster than the standard library
+except ImportError:
+    orjson = None
 from dotenv import dotenv_values
 
 # Define defaults and required keys
@@ -17,14 +29,25 @@ DEFAULTS = {
 
     "CSV_RECORD_HISTORY": "True",             # Optional: save weather records to CSV
     "CSV_RECORD_FILE": "records.csv",         # Optional: records file name, default is the current directory records.csv
+    "CSV_MAX_BYTES": "0",                     # Optional: rotate the records file to "<CSV_RECORD_FILE>.1" once it is larger than this, 0 never rotates
     "LOG_FILE_LOCATION": "weather_display.log",  # Optional: log file path
+    "LOG_CONSOLE": "False",                   # Optional: also print the log to the console, handy when running by hand
     "TRASH_DAYS": "",                         # Optional: comma-separated weekday values if empty string will not use "trash day" logic
                                               # 0 = Monday, 6 = Sunday; Multiple days can be passed as comma delimited list TRASH_DAYS=2,5
 
     "UPDATE_DISPLAY": "True",                 # Optional: actually update the display, when false it will output a test.jpg of what the image would be.
                                               # This can be used to test on devices that aren't your raspberry pi.
     "WEATHER_READ_DEBUG_JSON": "False",       # Optional: read debug file "weather_debug.json" rather than calling the weather API
-    "WEATHER_WRITE_DEBUG_JSON": "False"       # Optional: write debug file write the "weather_debug.json" files for caching and testing other functionality
+    "WEATHER_WRITE_DEBUG_JSON": "False",      # Optional: write debug file write the "weather_debug.json" files for caching and testing other functionality
+    "WEATHER_CACHE_FILE": "weather_cache.json",  # Optional: where the last API response is cached between runs
+    "WEATHER_CACHE_TTL": "600",               # Optional: seconds a cached API response is reused before calling the API again, 0 disables the cache
+
+    "DAEMON_MODE": "False",                   # Optional: keep running and refresh every REFRESH_SECONDS instead of exiting after one update (use instead of cron)
+    "REFRESH_SECONDS": "600",                 # Optional: seconds between updates in daemon mode, updates line up with the clock (e.g. 600 = every 10 minutes on the 10s)
+    "ADAPTIVE_REFRESH": "False",              # Optional: refresh every 5 minutes during alerts or when rain is likely and every 30 minutes otherwise.
+                                              # Replaces REFRESH_SECONDS in daemon mode, in cron mode runs that come too soon exit without updating.
+    "PARTIAL_REFRESH": "False"                # Optional: only redraw the part of the panel that changed (a couple of seconds, no flashing) with a full
+                                              # refresh every 10 updates to clear ghosting. Needs a panel that supports partial refresh.
 }
 
 def load_config(): 
@@ -39,94 +62,275 @@ def load_config():
         raise ValueError(f"Missing required config values: {', '.join(missing)}")
     return config
 
-config = load_config()
-
-API_KEY = config["OPENWEATHER_API_KEY"]
-LATITUDE = config["LATITUDE"]
-LONGITUDE = config["LONGITUDE"]
-UNITS = config["UNITS"]
-
-CSV_RECORD_HISTORY = config["CSV_RECORD_HISTORY"].lower() == "true"
-CSV_RECORD_FILE = config["CSV_RECORD_FILE"]
-LOG_FILE_LOCATION = config["LOG_FILE_LOCATION"]
-
-trash_days_str = config["TRASH_DAYS"] 
-TRASH_DAYS = [int(day.strip()) for day in trash_days_str.split(',') if day.strip().isdigit()]
-
-UPDATE_DISPLAY=config["UPDATE_DISPLAY"].lower() == "true"
-WEATHER_READ_DEBUG_JSON = config["WEATHER_READ_DEBUG_JSON"].lower() == "true"
-WEATHER_WRITE_DEBUG_JSON = config["WEATHER_WRITE_DEBUG_JSON"].lower() == 'true'
-
+# Settings parsed once from .env and passed to the functions that need them
+@dataclass(frozen=True)
+class Config:
+    api_key: str
+    latitude: str
+    longitude: str
+    units: str
+
+    csv_record_history: bool
+    csv_record_file: str
+    csv_max_bytes: int
+    log_file_location: str
+    log_console: bool
+    trash_days: frozenset[int]
+
+    update_display: bool
+    weather_read_debug_json: bool
+    weather_write_debug_json: bool
+    weather_cache_file: str
+    weather_cache_ttl: int
+
+    daemon_mode: bool
+    refresh_seconds: int
+    adaptive_refresh: bool
+    partial_refresh: bool
+
+    @classmethod
+    def from_env(cls):
+        config = load_config()
+
+        def flag(key):
+            return config[key].lower() == "true"
+
+        return cls(
+            api_key=config["OPENWEATHER_API_KEY"],
+            latitude=config["LATITUDE"],
+            longitude=config["LONGITUDE"],
+            units=config["UNITS"],
+            csv_record_history=flag("CSV_RECORD_HISTORY"),
+            csv_record_file=config["CSV_RECORD_FILE"],
+            csv_max_bytes=int(config["CSV_MAX_BYTES"]),
+            log_file_location=config["LOG_FILE_LOCATION"] or 'weather_display.log',
+            log_console=flag("LOG_CONSOLE"),
+            # Any run of digits is a day, so "2,5", "2, 5" and "2;5" all work
+            trash_days=frozenset(int(day) for day in re.findall(r'\d+', config["TRASH_DAYS"])),
+            update_display=flag("UPDATE_DISPLAY"),
+            weather_read_debug_json=flag("WEATHER_READ_DEBUG_JSON"),
+            weather_write_debug_json=flag("WEATHER_WRITE_DEBUG_JSON"),
+            weather_cache_file=config["WEATHER_CACHE_FILE"],
+            weather_cache_ttl=int(config["WEATHER_CACHE_TTL"]),
+            daemon_mode=flag("DAEMON_MODE"),
+            refresh_seconds=int(config["REFRESH_SECONDS"]),
+            adaptive_refresh=flag("ADAPTIVE_REFRESH"),
+            partial_refresh=flag("PARTIAL_REFRESH"),
+        )
+
+    # Where the adaptive refresh delay is remembered between runs
+    @property
+    def refresh_meta_file(self):
+        return f"{self.weather_cache_file}.meta"
+
+CFG = Config.from_env()
 
 BASE_URL = f'https://api.openweathermap.org/data/3.0/onecall'
+# Only current, daily and alerts are used, leaving out the 60 minutely and 48 hourly entries keeps the response small
+EXCLUDED_BLOCKS = "minutely,hourly"
 FONT_DIR = os.path.join(os.path.dirname(__file__), 'font')
 PIC_DIR = os.path.join(os.path.dirname(__file__), 'pic')
 ICON_DIR = os.path.join(PIC_DIR, 'icon')
+# Runs are scheduled at fixed periods but start a few seconds late. Anything timed from the last run
+# (the weather cache TTL, the display hash's forced refresh and the adaptive refresh delay) counts
+# as due this close to its deadline, so a run landing right on it isn't skipped until the next one.
+SCHEDULE_GRACE_SECONDS = 10
 
-# Logging configuration for both file and console
-if not LOG_FILE_LOCATION:
-    LOG_FILE_LOCATION = 'weather_display.log'
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+# Logging configuration, file always and console when LOG_CONSOLE is set
+root_logger = logging.getLogger()
+root_logger.setLevel(logging.INFO)
+log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 
 # Use RotatingFileHandler for log rotation
-file_handler = RotatingFileHandler(LOG_FILE_LOCATION, maxBytes=1_000_000, backupCount=3)  # 1MB file size, 3 backups
-file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
-logger.addHandler(file_handler)
+file_handler = RotatingFileHandler(CFG.log_file_location, maxBytes=1_000_000, backupCount=3)  # 1MB file size, 3 backups
+file_handler.setFormatter(log_formatter)
+
+# Hold records in memory and write them to the file in one go at the end of an update (or right away for errors).
+# logging.shutdown() flushes it when the script exits.
+log_buffer = MemoryHandler(capacity=100, flushLevel=logging.ERROR, target=file_handler)
+root_logger.addHandler(log_buffer)
 
 # Stream handler for logging to console
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
-logger.addHandler(console_handler)
+if CFG.log_console:
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(log_formatter)
+    root_logger.addHandler(console_handler)
 
+logger = logging.getLogger(__name__)
 logger.info("Weather display script started.")
 
-# Set fonts with specific sizes to match the old behavior
-font22 = ImageFont.truetype(os.path.join(FONT_DIR, 'Font.ttc'), 22)
-font30 = ImageFont.truetype(os.path.join(FONT_DIR, 'Font.ttc'), 30)
-font35 = ImageFont.truetype(os.path.join(FONT_DIR, 'Font.ttc'), 35)
-font50 = ImageFont.truetype(os.path.join(FONT_DIR, 'Font.ttc'), 50)
-font60 = ImageFont.truetype(os.path.join(FONT_DIR, 'Font.ttc'), 60)
-font100 = ImageFont.truetype(os.path.join(FONT_DIR, 'Font.ttc'), 100)
-font160 = ImageFont.truetype(os.path.join(FONT_DIR, 'Font.ttc'), 160)
+# Fonts are loaded on first use and kept, so paths that don't draw never open Font.ttc
+FONT_PATH = os.path.join(FONT_DIR, 'Font.ttc')
+
+@lru_cache(maxsize=None)
+def font(size):
+    from PIL import ImageFont
+    return ImageFont.truetype(FONT_PATH, size)
+
 COLORS = {'black': 'rgb(0,0,0)', 'white': 'rgb(255,255,255)', 'grey': 'rgb(235,235,235)'}
 
-# Fetch weather data
-def fetch_weather_data():
-    url = f"{BASE_URL}?lat={LATITUDE}&lon={LONGITUDE}&units={UNITS}&appid={API_KEY}&exclude=minutely,hourly"
+# Shared HTTP session so the connection (DNS, TLS) is reused, with retries for transient API errors.
+# It's created on first use so runs served from the cache or debug file never import requests.
+REQUEST_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+_SESSION = None
+
+def get_session():
+    global _SESSION
+    if _SESSION is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=retries)
+        _SESSION = requests.Session()
+        _SESSION.mount('http://', adapter)
+        _SESSION.mount('https://', adapter)
+    return _SESSION
+
+def close_session():
+    global _SESSION
+    if _SESSION is not None:
+        _SESSION.close()
+        _SESSION = None
+
+# JSON helpers that use orjson when it's installed and fall back to the standard library
+def json_loads(content):
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+def json_dumps_pretty(data):
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode()
+
+# The request settings a cached response is only valid for, a changed location or units in .env ignores the cache
+def cache_query(cfg):
+    return {"lat": cfg.latitude, "lon": cfg.longitude, "units": cfg.units, "exclude": EXCLUDED_BLOCKS}
+
+# Read the cached API response, returns (data, mtime) or None if there isn't one for the current settings
+def read_weather_cache(cfg):
+    try:
+        mtime = os.stat(cfg.weather_cache_file).st_mtime
+        with open(cfg.weather_cache_file, 'rb') as f:
+            cached = json_loads(f.read())
+        if cached.get("query") != cache_query(cfg):
+            return None
+        return cached["response"], mtime
+    except (OSError, ValueError, KeyError, AttributeError):
+        return None
+
+# Write the raw API response to the cache along with the query it answers, replacing the old one
+# atomically so overlapping runs never see a partial file
+def write_weather_cache(cfg, content):
+    tmp_path = f"{cfg.weather_cache_file}.tmp{os.getpid()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(b'{"query": ' + json.dumps(cache_query(cfg)).encode() + b', "response": ')
+            f.write(content)
+            f.write(b'}')
+        os.replace(tmp_path, cfg.weather_cache_file)
+    except OSError as e:
+        logger.warning(f"Failed to write weather cache: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+# Adaptive refresh intervals, see ADAPTIVE_REFRESH in DEFAULTS
+ADAPTIVE_FAST_SECONDS = 300
+ADAPTIVE_SLOW_SECONDS = 1800
+
+# Refresh sooner while there's an alert or rain is likely, back off when it's calm
+def next_refresh_delay(weather_data):
+    if weather_data['alert_count'] == 0 and weather_data['precip_percent'] < 10:
+        return ADAPTIVE_SLOW_SECONDS
+    return ADAPTIVE_FAST_SECONDS
+
+# Remember the delay picked by the last update, the file's mtime is set to when that update started
+def write_refresh_delay(cfg, delay, updated_at):
+    try:
+        with open(cfg.refresh_meta_file, 'w') as f:
+            json.dump({"next_delay": delay}, f)
+        os.utime(cfg.refresh_meta_file, (updated_at, updated_at))
+    except OSError as e:
+        logger.warning(f"Failed to write refresh metadata: {e}")
+
+# Returns (delay picked by the last update, seconds since that update), or None if unknown
+def read_refresh_delay(cfg):
+    try:
+        mtime = os.stat(cfg.refresh_meta_file).st_mtime
+        with open(cfg.refresh_meta_file, 'r') as f:
+            return int(json.load(f)["next_delay"]), time.time() - mtime
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
 
-    # Environment-based flags
-    WEATHER_READ_DEBUG_JSON = os.getenv('WEATHER_READ_DEBUG_JSON', 'False') == 'True'
-    WEATHER_WRITE_DEBUG_JSON = os.getenv('WEATHER_WRITE_DEBUG_JSON', 'False') == 'True'
+# Fetch weather data
+def fetch_weather_data(cfg, max_age=None):
+    params = {
+        "lat": cfg.latitude,
+        "lon": cfg.longitude,
+        "units": cfg.units,
+        "exclude": EXCLUDED_BLOCKS,
+        "appid": cfg.api_key,
+    }
+    if max_age is None:
+        max_age = cfg.weather_cache_ttl
     debug_file_path = 'weather_debug.json'
 
-    if WEATHER_READ_DEBUG_JSON:
+    if cfg.weather_read_debug_json:
         try:
-            with open(debug_file_path, 'r') as f:
-                logging.info("Reading weather data from debug JSON file.")
-                return json.load(f)
+            with open(debug_file_path, 'rb') as f:
+                logger.info("Reading weather data from debug JSON file.")
+                return json_loads(f.read())
         except Exception as e:
-            logging.error(f"Failed to read debug JSON file: {e}")
+            logger.error(f"Failed to read debug JSON file: {e}")
             raise
 
+    cached = read_weather_cache(cfg) if cfg.weather_cache_ttl > 0 else None
+    if cached is not None:
+        data, mtime = cached
+        if time.time() - mtime < max_age - SCHEDULE_GRACE_SECONDS:
+            logger.info("Using cached weather data.")
+            return data
+
+    import requests
+    session = get_session()
+
+    headers = {}
+    if cached is not None:
+        headers['If-Modified-Since'] = formatdate(cached[1], usegmt=True)
+
     try:
-        response = requests.get(url)
+        response = session.get(BASE_URL, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        logging.info("Weather data fetched successfully.")
-        data = response.json()
-
-        if WEATHER_WRITE_DEBUG_JSON:
+        # Only sent back when there's a cached copy to send If-Modified-Since for
+        if response.status_code == 304:
+            # Touch the cache so the TTL starts over
+            try:
+                os.utime(cfg.weather_cache_file)
+            except OSError as e:
+                logger.warning(f"Failed to touch weather cache: {e}")
+            logger.info("Weather data not modified, using cached copy.")
+            return cached[0]
+        logger.info("Weather data fetched successfully.")
+        data = json_loads(response.content)
+
+        if cfg.weather_cache_ttl > 0:
+            write_weather_cache(cfg, response.content)
+
+        if cfg.weather_write_debug_json:
             try:
-                with open(debug_file_path, 'w') as f:
-                    json.dump(data, f, indent=2)
-                    logging.info("Weather data written to debug JSON file.")
+                with open(debug_file_path, 'wb') as f:
+                    f.write(json_dumps_pretty(data))
+                    logger.info("Weather data written to debug JSON file.")
             except Exception as e:
-                logging.warning(f"Failed to write debug data: {e}")
+                logger.warning(f"Failed to write debug data: {e}")
 
         return data
 
     except requests.RequestException as e:
-        logging.error(f"Failed to fetch weather data: {e}")
+        logger.error(f"Failed to fetch weather data: {e}")
         raise
 
 # Process weather data
@@ -150,24 +354,35 @@ def process_weather_data(data):
             "alert_count": alert_count,
             "alert_names": event_names,
         }
-        logging.info("Weather data processed successfully.")
+        logger.info("Weather data processed successfully.")
         return weather_data
     except KeyError as e:
-        logging.error(f"Error processing weather data: {e}")
+        logger.error(f"Error processing weather data: {e}")
         raise
 
+# Records file handle, opened once and kept for the life of the process
+_CSV_FP = None
+
+def open_csv_file(cfg):
+    global _CSV_FP
+    if _CSV_FP is None:
+        _CSV_FP = open(cfg.csv_record_file, 'a', buffering=8192, newline='')
+    return _CSV_FP
+
+# Move the records file to "<CSV_RECORD_FILE>.1" like RotatingFileHandler does and start a new one
+def rotate_csv_file(cfg):
+    global _CSV_FP
+    if _CSV_FP is not None:
+        _CSV_FP.close()
+        _CSV_FP = None
+    os.replace(cfg.csv_record_file, f"{cfg.csv_record_file}.1")
+    logger.info("Rotated CSV records file.")
+    return open_csv_file(cfg)
+
 # Save weather data to CSV
-def save_to_csv(weather_data):
-    if not CSV_RECORD_HISTORY:
+def save_to_csv(cfg, weather_data, now):
+    if not cfg.csv_record_history:
         return
-    filename = CSV_RECORD_FILE
-    file_exists = os.path.exists(filename)
-
-    now = datetime.now()
-    year = now.strftime('%Y')
-    month = now.strftime('%m')
-    date = now.strftime('%d')
-    time = now.strftime('%H:%M')
 
     header = [
         "YEAR", "MONTH", "DATE", "TIME",
@@ -176,7 +391,7 @@ def save_to_csv(weather_data):
     ]
 
     row = [
-        year, month, date, time,
+        now.year, f"{now.month:02d}", f"{now.day:02d}", f"{now:%H:%M}",
         weather_data["temp_current"],
         weather_data["feels_like"],
         weather_data["temp_max"],
@@ -187,109 +402,407 @@ def save_to_csv(weather_data):
     ]
 
     try:
-        with open(filename, 'a', newline='') as csv_file:
-            writer = csv.writer(csv_file)
-            if not file_exists:
-                writer.writerow(header)
-            writer.writerow(row)
-        logging.info("Weather data appended to CSV.")
+        csv_file = open_csv_file(cfg)
+        size = os.fstat(csv_file.fileno()).st_size
+        if cfg.csv_max_bytes > 0 and size > cfg.csv_max_bytes:
+            csv_file = rotate_csv_file(cfg)
+            size = 0
+        writer = csv.writer(csv_file)
+        # A new (or just rotated) file gets the header
+        if size == 0:
+            writer.writerow(header)
+        writer.writerow(row)
+        csv_file.flush()
+        logger.info("Weather data appended to CSV.")
     except IOError as e:
-        logging.error(f"Failed to save data to CSV: {e}")
+        logger.error(f"Failed to save data to CSV: {e}")
+
+# Labels that never change between runs, these are baked into the template once
+# key: (position, text, font size, color)
+STATIC_LABELS = {
+    'now': ((30, 200), "Now: ", 22, COLORS['black']),
+    'precip': ((30, 240), "Precip: ", 30, COLORS['black']),
+    'feels': ((350, 210), "Feels like: ", 50, COLORS['black']),
+    'high': ((35, 325), "High: ", 50, COLORS['black']),
+    'low': ((35, 390), "Low: ", 50, COLORS['black']),
+    'humidity': ((345, 340), "Humidity: ", 30, COLORS['black']),
+    'wind': ((345, 400), "Wind: ", 30, COLORS['black']),
+    'updated': ((627, 330), "UPDATED", 35, COLORS['white']),
+}
+PRERENDERED_TEMPLATE = os.path.join(PIC_DIR, 'template_prerendered.png')
+DISPLAY_SIZE = (800, 480)  # epd7in5_V2 width, height
+
+# Position right after a static label where its value gets drawn
+@lru_cache(maxsize=None)
+def value_position(key):
+    (x, y), text, size, _ = STATIC_LABELS[key]
+    return x + round(font(size).getlength(text)), y
+
+# Draw the static labels onto template.png and store it in the display's 1-bit format
+# at the panel's size, so each update draws straight into what gets sent to the display
+def build_prerendered_template():
+    from PIL import Image, ImageDraw
+    template = Image.open(os.path.join(PIC_DIR, 'template.png')).convert('RGB')
+    if template.size != DISPLAY_SIZE:
+        canvas = Image.new('RGB', DISPLAY_SIZE, COLORS['white'])
+        canvas.paste(template, (0, 0))
+        template = canvas
+    draw = ImageDraw.Draw(template)
+    for position, text, size, color in STATIC_LABELS.values():
+        draw.text(position, text, font=font(size), fill=color)
+    template = template.convert('1', dither=Image.Dither.FLOYDSTEINBERG)
+    # Write to a temp file and swap it in, so a run that's interrupted mid-save (or another run
+    # loading it at the same time) never sees a half-written template
+    tmp_path = f"{PRERENDERED_TEMPLATE}.tmp{os.getpid()}"
+    try:
+        template.save(tmp_path, format='PNG')
+        os.replace(tmp_path, PRERENDERED_TEMPLATE)
+        logger.info("Prerendered template rebuilt.")
+    except OSError as e:
+        logger.warning(f"Failed to save prerendered template: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    return template
+
+# Load and decode the background template, rebuilding the prerendered copy when the
+# template, font or this script (which holds the labels) is newer than it
+@lru_cache(maxsize=None)
+def load_template():
+    from PIL import Image
+    sources = [os.path.join(PIC_DIR, 'template.png'), FONT_PATH, __file__]
+    try:
+        stale = os.stat(PRERENDERED_TEMPLATE).st_mtime < max(os.stat(path).st_mtime for path in sources)
+    except OSError:
+        stale = True
+    if stale:
+        return build_prerendered_template()
+    try:
+        template = Image.open(PRERENDERED_TEMPLATE)
+        template.load()
+    except (OSError, SyntaxError) as e:
+        logger.warning(f"Failed to load prerendered template, rebuilding it: {e}")
+        return build_prerendered_template()
+    if template.mode != '1' or template.size != DISPLAY_SIZE:
+        return build_prerendered_template()
+    return template
+
+# Decode every weather icon once, keyed by OpenWeather icon code (e.g. "01d")
+@lru_cache(maxsize=None)
+def load_icons():
+    from PIL import Image
+    icons = {}
+    for filename in os.listdir(ICON_DIR):
+        code, ext = os.path.splitext(filename)
+        if ext == '.png':
+            icon = Image.open(os.path.join(ICON_DIR, filename))
+            icon.load()
+            icons[code] = icon
+    return icons
+
+# Every value shown on the display, formatted before any drawing starts
+DisplayStrings = namedtuple('DisplayStrings', 'report precip temp feels high low humidity wind updated')
+
+def format_display_strings(weather_data, now):
+    return DisplayStrings(
+        report=weather_data['report'],
+        precip=f"{weather_data['precip_percent']:.0f}%",
+        temp=f"{weather_data['temp_current']:.0f}°F",
+        feels=f"{weather_data['feels_like']:.0f}°F",
+        high=f"{weather_data['temp_max']:.0f}°F",
+        low=f"{weather_data['temp_min']:.0f}°F",
+        humidity=f"{weather_data['humidity']}%",
+        wind=f"{weather_data['wind']:.1f} MPH",
+        updated=f"{now:%H:%M}",
+    )
+
+# Text for the banner above the temperature, or None for no banner.
+# If there's weather alert it will trump a Trash day alert
+# TODO make this logic better either remove trash day or move it elsewhere
+def pick_banner(weather_data, weekday, trash_days):
+    alert_count = weather_data['alert_count']
+    if alert_count > 1:
+        # Add the count if more than one alert
+        return f"({alert_count}) {weather_data['alert_names']}"
+    if alert_count == 1:
+        return weather_data['alert_names']
+    # Trash reminder based on TRASH_DAYS config
+    if weekday in trash_days:
+        return 'TAKE OUT TRASH TODAY!'
+    return None
 
 # Generate display image
-def generate_display_image(weather_data):
+def generate_display_image(cfg, weather_data, template, icons, now):
+    from PIL import ImageDraw
     try:
-        template = Image.open(os.path.join(PIC_DIR, 'template.png'))
+        # Draw on a copy, the template is reused between updates in daemon mode
+        template = template.copy()
         draw = ImageDraw.Draw(template)
-        icon_path = os.path.join(ICON_DIR, f"{weather_data['icon_code']}.png")
-        icon_image = Image.open(icon_path) if os.path.exists(icon_path) else None
+        icon_image = icons.get(weather_data['icon_code'])
 
         if icon_image:
             template.paste(icon_image, (40, 15))
 
-        draw.text((30, 200), f"Now: {weather_data['report']}", font=font22, fill=COLORS['black'])
-        draw.text((30, 240), f"Precip: {weather_data['precip_percent']:.0f}%", font=font30, fill=COLORS['black'])
-        draw.text((375, 35), f"{weather_data['temp_current']:.0f}°F", font=font160, fill=COLORS['black'])
-        draw.text((350, 210), f"Feels like: {weather_data['feels_like']:.0f}°F", font=font50, fill=COLORS['black'])
-        draw.text((35, 325), f"High: {weather_data['temp_max']:.0f}°F", font=font50, fill=COLORS['black'])
-        draw.text((35, 390), f"Low: {weather_data['temp_min']:.0f}°F", font=font50, fill=COLORS['black'])
-        draw.text((345, 340), f"Humidity: {weather_data['humidity']}%", font=font30, fill=COLORS['black'])
-        draw.text((345, 400), f"Wind: {weather_data['wind']:.1f} MPH", font=font30, fill=COLORS['black'])
-        draw.text((627, 330), "UPDATED", font=font35, fill=COLORS['white'])
-        current_time = datetime.now().strftime('%H:%M')
-        draw.text((627, 375), current_time, font=font60, fill=COLORS['white'])
-
-
-        # If there's weather alert it will trump a Trash day alert
-        # TODO make this logic better either remove trash day or move it elsewhere
+        # Labels are already on the prerendered template, only the values are drawn here
+        strings = format_display_strings(weather_data, now)
+        banner = pick_banner(weather_data, now.weekday(), cfg.trash_days)
+        draw.text(value_position('now'), strings.report, font=font(22), fill=COLORS['black'])
+        draw.text(value_position('precip'), strings.precip, font=font(30), fill=COLORS['black'])
+        draw.text((375, 35), strings.temp, font=font(160), fill=COLORS['black'])
+        draw.text(value_position('feels'), strings.feels, font=font(50), fill=COLORS['black'])
+        draw.text(value_position('high'), strings.high, font=font(50), fill=COLORS['black'])
+        draw.text(value_position('low'), strings.low, font=font(50), fill=COLORS['black'])
+        draw.text(value_position('humidity'), strings.humidity, font=font(30), fill=COLORS['black'])
+        draw.text(value_position('wind'), strings.wind, font=font(30), fill=COLORS['black'])
+        draw.text((627, 375), strings.updated, font=font(60), fill=COLORS['white'])
+
+
         # TODO dynamically scale box size to center text 
-        if weather_data['alert_count'] > 0:
-            alerts = weather_data['alert_names']
-            alert_count = weather_data['alert_count'] 
+        if banner is not None:
             draw.rectangle((345, 13, 705, 55), fill=COLORS['black'])
-            # Add the count if more than one alert
-            if alert_count > 1:
-                alertString = f"({alert_count}) {alerts}"
-            else:
-                alertString = alerts
-            draw.text((355, 15), alertString, font=font30, fill=COLORS['white'])
-        else:
-            # Trash reminder based on TRASH_DAYS config
-            weekday = datetime.today().weekday()
-            if weekday in TRASH_DAYS:
-                draw.rectangle((345, 13, 705, 55), fill=COLORS['black'])
-                draw.text((355, 15), 'TAKE OUT TRASH TODAY!', font=font30, fill=COLORS['white'])
+            draw.text((355, 15), banner, font=font(30), fill=COLORS['white'])
 
-        logging.info("Display image generated successfully.")
+        logger.info("Display image generated successfully.")
         return template
     except Exception as e:
-        logging.error(f"Error generating display image: {e}")
+        logger.error(f"Error generating display image: {e}")
         raise
 
+# Hash of what was last shown on the display, the UPDATED time is left out so it only changes with the weather
+LAST_HASH_FILE = os.path.join(tempfile.gettempdir(), 'weather_last.hash')
+# Redraw at least this often even if nothing changed so the UPDATED time doesn't go stale
+FORCE_REFRESH_SECONDS = 3600
+
+def display_hash(weather_data, now):
+    # The weekday is included because it decides the trash day banner
+    payload = json.dumps({**weather_data, "weekday": now.weekday()}, sort_keys=True)
+    return hashlib.blake2b(payload.encode(), digest_size=16).digest()
+
+# True if the display already shows this data and was refreshed recently enough
+def display_unchanged(digest):
+    try:
+        if time.time() - os.stat(LAST_HASH_FILE).st_mtime >= FORCE_REFRESH_SECONDS - SCHEDULE_GRACE_SECONDS:
+            return False
+        with open(LAST_HASH_FILE, 'rb') as f:
+            return f.read() == digest
+    except OSError:
+        return False
+
+# The file's mtime is set to when the update started, not when the (slow) panel refresh finished
+def write_display_hash(digest, updated_at):
+    try:
+        with open(LAST_HASH_FILE, 'wb') as f:
+            f.write(digest)
+        os.utime(LAST_HASH_FILE, (updated_at, updated_at))
+    except OSError as e:
+        logger.warning(f"Failed to write display hash: {e}")
+
+# The display is set up once and kept for the life of the process
+_EPD = None
+_EPD_AWAKE = False
+
+# Last frame sent to the display, kept in memory in daemon mode and in the temp dir between cron runs.
+# The number of partial refreshes since the last full one is stored in the PNG's text metadata.
+LAST_FRAME_FILE = os.path.join(tempfile.gettempdir(), 'weather_last.png')
+FULL_REFRESH_EVERY = 10
+_LAST_FRAME = None
+
+def read_last_frame():
+    from PIL import Image
+    global _LAST_FRAME
+    if _LAST_FRAME is None:
+        try:
+            frame = Image.open(LAST_FRAME_FILE)
+            frame.load()
+            _LAST_FRAME = (frame, int(frame.text.get('partial_updates', 0)))
+        except (OSError, ValueError):
+            return None, 0
+    return _LAST_FRAME
+
+def write_last_frame(image, partial_updates):
+    from PIL.PngImagePlugin import PngInfo
+    global _LAST_FRAME
+    _LAST_FRAME = (image, partial_updates)
+    info = PngInfo()
+    info.add_text('partial_updates', str(partial_updates))
+    try:
+        image.save(LAST_FRAME_FILE, pnginfo=info)
+    except OSError as e:
+        logger.warning(f"Failed to save last frame: {e}")
+
+# Deep sleep powers the panel off and loses the previous frame partial refreshes are drawn against,
+# so the next update has to be a full refresh
+def forget_last_frame():
+    global _LAST_FRAME
+    _LAST_FRAME = None
+    try:
+        os.remove(LAST_FRAME_FILE)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Failed to remove last frame: {e}")
+
+# Decide how to get image onto the display: ('full', None), ('none', None) when nothing changed, or
+# ('partial', box) with the box around the changed pixels widened to whole bytes (8 pixels) as the panel addresses them
+def plan_refresh(cfg, image):
+    if not cfg.partial_refresh:
+        return 'full', None
+    from PIL import ImageChops
+    last_frame, partial_updates = read_last_frame()
+    if last_frame is None or partial_updates >= FULL_REFRESH_EVERY or last_frame.size != image.size:
+        return 'full', None
+    bbox = ImageChops.difference(last_frame.convert('1'), image).getbbox()
+    if bbox is None:
+        return 'none', None
+    left, top, right, bottom = bbox
+    return 'partial', (left // 8 * 8, top, -(-right // 8) * 8, bottom)
+
 # Display image on screen
-def display_image(image):
+def display_image(cfg, image):
+    global _EPD, _EPD_AWAKE
+    refresh, box = plan_refresh(cfg, image)
+    if refresh == 'none':
+        logger.info("Image matches what's on the display, nothing to refresh.")
+        return
+
     # Initialize display
     try:
-        from lib.waveshare_epd import epd7in5_V2
-        epd = epd7in5_V2.EPD()
-        epd.init()
-        epd.Clear()
+        if _EPD is None:
+            from lib.waveshare_epd import epd7in5_V2
+            _EPD = epd7in5_V2.EPD()
+        epd = _EPD
+        if refresh == 'partial':
+            epd.init_part()
+        else:
+            epd.init()
+            epd.Clear()
+        _EPD_AWAKE = True
     except Exception as e:
-        logging.error(f"Initializing display: {e}")
+        logger.error(f"Initializing display: {e}")
         raise
 
     try:
-        h_image = Image.new('1', (epd.width, epd.height), 255)
-        h_image.paste(image, (0, 0))
-        epd.display(epd.getbuffer(h_image))
-        logging.info("Image displayed on e-paper successfully.")
+        if refresh == 'partial':
+            # Same byte layout as epd.getbuffer(), which only accepts full frames
+            region = bytearray(image.crop(box).tobytes('raw'))
+            for i in range(len(region)):
+                region[i] ^= 0xFF
+            epd.display_Partial(region, *box)
+            partial_updates = read_last_frame()[1] + 1
+            logger.info(f"Partial refresh of {box} on e-paper successful.")
+        else:
+            # The image is already 1-bit at the panel's size
+            epd.display(epd.getbuffer(image))
+            partial_updates = 0
+            logger.info("Image displayed on e-paper successfully.")
+        if cfg.partial_refresh:
+            write_last_frame(image, partial_updates)
     except Exception as e:
-        logging.error(f"Failed to display image: {e}")
+        logger.error(f"Failed to display image: {e}")
         raise
 
+# Put the display into deep sleep between updates, it is woken up again by the next init()
+def sleep_display():
+    global _EPD_AWAKE
+    if _EPD is not None and _EPD_AWAKE:
+        try:
+            _EPD.sleep()
+        except Exception as e:
+            logger.error(f"Failed to put display to sleep: {e}")
+        _EPD_AWAKE = False
+        forget_last_frame()
+
 def debug_output_image(image):
     try:
-        outImage = Image.new('1', (800,480), 255)
-        outImage.paste(image, (0, 0))
-        outImage.save('test.jpg')
+        image.save('test.jpg')
     except Exception as e:
-        logging.error(f"Failed output: {e}")
+        logger.error(f"Failed output: {e}")
         raise
 
-# Main function
-def main():
+# Fetch, draw and show one update, returns how long to wait before the next one
+async def run_once(cfg):
+    delay = cfg.refresh_seconds
+    max_age = cfg.weather_cache_ttl
+    if cfg.adaptive_refresh:
+        last = read_refresh_delay(cfg)
+        if last is not None:
+            last_delay, age = last
+            # In cron mode a run that comes before the adaptive delay is up has nothing to do
+            if not cfg.daemon_mode and age < last_delay - SCHEDULE_GRACE_SECONDS:
+                logger.info(f"Last update was {age:.0f}s ago, next one is due after {last_delay}s. Skipping.")
+                return last_delay
+            max_age = min(max_age, last_delay)
+
     try:
-        data = fetch_weather_data()
+        # The API call and the image decodes don't depend on each other so run them side by side
+        data, template, icons = await asyncio.gather(
+            asyncio.to_thread(fetch_weather_data, cfg, max_age),
+            asyncio.to_thread(load_template),
+            asyncio.to_thread(load_icons),
+        )
         weather_data = process_weather_data(data)
-        save_to_csv(weather_data)
-        image = generate_display_image(weather_data)
-        if UPDATE_DISPLAY:
-            display_image(image)
-            return
-        logging.info("Image not being displayed, only created JPG of image to create")
-        debug_output_image(image)
+        # One clock reading for the whole update so the CSV row, the UPDATED time and the trash day all agree
+        now = datetime.now()
+        if cfg.adaptive_refresh:
+            delay = next_refresh_delay(weather_data)
+        save_to_csv(cfg, weather_data, now)
+        if cfg.update_display:
+            digest = display_hash(weather_data, now)
+            if display_unchanged(digest):
+                logger.info("Weather data unchanged since the last update, leaving the display as is.")
+            else:
+                image = generate_display_image(cfg, weather_data, template, icons, now)
+                display_image(cfg, image)
+                write_display_hash(digest, now.timestamp())
+        else:
+            image = generate_display_image(cfg, weather_data, template, icons, now)
+            logger.info("Image not being displayed, only created JPG of image to create")
+            debug_output_image(image)
+        # Only recorded once the update went through, so a failed one is retried by the next cron run
+        if cfg.adaptive_refresh:
+            write_refresh_delay(cfg, delay, now.timestamp())
+            logger.info(f"Next update in {delay} seconds.")
     except Exception as e:
-        logging.error(f"An unexpected error occurred: {e}")
+        logger.error(f"An unexpected error occurred: {e}")
+    return delay
+
+# Keep updating every REFRESH_SECONDS (or the adaptive delay) until SIGTERM/SIGINT, fonts, icons, the template,
+# the HTTP session and the display handle are all reused between updates
+async def run_forever(cfg):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    if cfg.adaptive_refresh:
+        logger.info("Running in daemon mode with adaptive refresh.")
+    else:
+        logger.info(f"Running in daemon mode, refreshing every {cfg.refresh_seconds} seconds.")
+    try:
+        while not stop.is_set():
+            period = await run_once(cfg)
+            # Partial refreshes need the panel to keep the last frame, so it stays powered between updates
+            if not cfg.partial_refresh:
+                sleep_display()
+            log_buffer.flush()
+            # Sleep until the next multiple of the period so updates stay on the clock
+            delay = period - (time.time() % period)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        sleep_display()
+        close_session()
+        logger.info("Weather display daemon stopped.")
+
+# Main function
+async def main(cfg):
+    if cfg.daemon_mode:
+        await run_forever(cfg)
+    else:
+        await run_once(cfg)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main(CFG))
\ No newline at end of file